@@ -0,0 +1,408 @@
+"""
+Shared GitHub access layer for the helper scripts (not meant to be run directly).
+
+gh CLI is used to resolve the repository / PR from the local git context and to
+read the github.com auth token; data is fetched from api.github.com over persistent
+HTTPS connections (one per thread), tunnelled through HTTPS_PROXY when set.
+Only github.com is supported (no GitHub Enterprise hosts). REST responses can be cached in
+~/.cache/mydotcodex and revalidated with their ETag (If-None-Match).
+
+The scripts run as `python3 scripts/<name>.py`, so this module is importable
+from the scripts directory without any install step.
+"""
+
+from __future__ import annotations
+
+import base64
+import contextlib
+import http.client
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # optional speedup, stdlib json is used when it isn't installed
+    orjson = None
+
+API_HOST = "api.github.com"
+CACHE_DIR = Path.home() / ".cache" / "mydotcodex"
+AUTH_CACHE_TTL = 600  # seconds
+PER_PAGE = 100
+CHUNK_SIZE = 64 * 1024
+MAX_REDIRECTS = 5
+
+GITHUB_PR_URL_RE = re.compile(r"(?:^|//)github\.com/([^/]+)/([^/]+)/pull/(\d+)")
+GITHUB_REPO_URL_RE = re.compile(r"https://github\.com/([^/]+)/([^/]+?)/?")
+
+# What a keep-alive socket closed by the server looks like; timeouts and other errors are not retried.
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    http.client.CannotSendRequest,
+    http.client.ResponseNotReady,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+_local = threading.local()
+_token: Optional[str] = None
+_token_lock = threading.Lock()
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj).encode()
+
+
+def write_result(result: Any) -> None:
+    if orjson is not None:
+        sys.stdout.flush()
+        sys.stdout.buffer.write(orjson.dumps(result, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+def run(cmd: list[str]) -> bytes:
+    p = subprocess.run(cmd, capture_output=True)
+    if p.returncode != 0:
+        raise RuntimeError(f"Command failed: {' '.join(cmd)}\n{p.stderr.decode(errors='replace').strip()}")
+    return p.stdout
+
+
+def run_json(cmd: list[str]) -> dict[str, Any]:
+    out = run(cmd)
+    try:
+        return loads(out)
+    except json.JSONDecodeError as e:
+        raise RuntimeError(f"Failed to parse JSON from command output: {e}\nRaw:\n{out.decode(errors='replace')}") from e
+
+
+def ensure_cache_dir(path: Path) -> None:
+    """
+    Create the parent directories of a cache file. CACHE_DIR is kept private (0o700):
+    it holds issue bodies and diffs from private repositories.
+    """
+    CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    os.chmod(CACHE_DIR, 0o700)  # also tighten a directory created with the default umask
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+
+@contextlib.contextmanager
+def atomic_write(path: Path) -> Iterator[BinaryIO]:
+    """
+    Write to a private temporary file next to path and move it into place on success.
+    """
+    ensure_cache_dir(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+def ensure_gh_authenticated() -> None:
+    """
+    `gh auth status` is slow and rarely changes: a successful check is cached for AUTH_CACHE_TTL seconds.
+    """
+    marker = CACHE_DIR / "auth_ok"
+    try:
+        if time.time() - marker.stat().st_mtime < AUTH_CACHE_TTL:
+            return
+    except OSError:
+        pass  # missing or unreadable marker: check again
+
+    try:
+        run(["gh", "auth", "status"])
+    except Exception:
+        raise RuntimeError("GitHub CLI is not authenticated. Run: gh auth login") from None
+
+    try:
+        ensure_cache_dir(marker)
+        marker.touch()
+    except OSError:
+        pass  # caching is best effort
+
+
+def token() -> str:
+    """
+    Read the gh token once per process; every API call reuses it.
+    The lock makes concurrent first calls (thread pool workers) wait for a single `gh auth token`.
+    """
+    global _token
+    with _token_lock:
+        if _token is None:
+            # Only github.com is supported: never pick up a GitHub Enterprise token.
+            _token = run(["gh", "auth", "token", "--hostname", "github.com"]).decode().strip()
+        return _token
+
+
+def _connection() -> http.client.HTTPSConnection:
+    """
+    One persistent HTTPS connection per thread (http.client is not thread-safe).
+    Like gh, honour HTTPS_PROXY / NO_PROXY: the connection is then tunnelled through the proxy.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        proxy = urllib.request.getproxies().get("https")
+        if proxy and not urllib.request.proxy_bypass(API_HOST):
+            conn = _proxy_connection(proxy)
+        else:
+            conn = http.client.HTTPSConnection(API_HOST, timeout=60)
+        _local.conn = conn
+    return conn
+
+
+def _proxy_connection(proxy: str) -> http.client.HTTPSConnection:
+    url = urllib.parse.urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+    if not url.hostname:
+        raise RuntimeError(f"Unsupported proxy URL: {proxy!r}")
+    headers = {}
+    if url.username:
+        credentials = f"{urllib.parse.unquote(url.username)}:{urllib.parse.unquote(url.password or '')}"
+        headers["Proxy-Authorization"] = f"Basic {base64.b64encode(credentials.encode()).decode()}"
+    conn = http.client.HTTPSConnection(url.hostname, url.port or 8080, timeout=60)
+    conn.set_tunnel(API_HOST, 443, headers=headers)
+    return conn
+
+
+def open_request(
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        accept: str = "application/vnd.github+json",
+        extra_headers: Optional[dict[str, str]] = None,
+) -> http.client.HTTPResponse:
+    """
+    Send a request and return the response with its body still unread, so large
+    bodies can be copied out in chunks. It must be read to the end before the
+    thread's connection is reused.
+    Redirects to API_HOST are followed; any status other than 200 / 304 raises.
+    """
+    headers = {
+        "Authorization": f"Bearer {token()}",
+        "Accept": accept,
+        "User-Agent": "my-dot-codex",
+        "X-GitHub-Api-Version": "2022-11-28",
+    }
+    if body is not None:
+        headers["Content-Type"] = "application/json"
+    if extra_headers:
+        headers.update(extra_headers)
+
+    conn = _connection()
+    for _ in range(MAX_REDIRECTS + 1):
+        for attempt in range(2):
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                break
+            except _STALE_CONNECTION_ERRORS:
+                # The server may have dropped the idle keep-alive socket: retry once on a fresh one.
+                conn.close()
+                if attempt:
+                    raise
+
+        if resp.status in (200, 304):
+            return resp
+
+        data = resp.read()
+        location = _redirect_path(resp)
+        if location is None:
+            raise RuntimeError(f"Request failed: {method} {path} ({resp.status})\n{data.decode(errors='replace').strip()}")
+        # Transferred issues and renamed repositories answer 301 (gh followed these): re-issue the same request.
+        path = location
+
+    raise RuntimeError(f"Request failed: {method} {path} (too many redirects)")
+
+
+def _redirect_path(resp: http.client.HTTPResponse) -> Optional[str]:
+    """
+    Path to follow for a 301/302/307 to API_HOST; None for any other response.
+    """
+    if resp.status not in (301, 302, 307):
+        return None
+    url = urllib.parse.urlsplit(resp.getheader("Location") or "")
+    if url.scheme != "https" or url.hostname != API_HOST or not url.path:
+        return None
+    return f"{url.path}?{url.query}" if url.query else url.path
+
+
+def request(
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        accept: str = "application/vnd.github+json",
+        extra_headers: Optional[dict[str, str]] = None,
+) -> Tuple[http.client.HTTPResponse, bytes]:
+    resp = open_request(method, path, body=body, accept=accept, extra_headers=extra_headers)
+    return resp, resp.read()
+
+
+def graphql(query: str, variables: dict[str, Any]) -> dict[str, Any]:
+    _, out = request("POST", "/graphql", body=dumps({"query": query, "variables": variables}))
+    try:
+        payload = loads(out)
+    except json.JSONDecodeError as e:
+        raise RuntimeError(f"Failed to parse JSON response: {e}\nRaw:\n{out!r}") from e
+
+    if "errors" in payload and payload["errors"]:
+        raise RuntimeError(f"GitHub GraphQL errors:\n{json.dumps(payload['errors'], indent=2)}")
+    return payload["data"]
+
+
+def stream_cached(path: str, cache_file: Path, out: BinaryIO, accept: str = "application/vnd.github+json") -> None:
+    """
+    Conditional GET copied to out in CHUNK_SIZE pieces, so the body is never held in memory.
+    The stored ETag is replayed and the stored body is copied instead on 304;
+    304 responses don't count against the rate limit and carry no body.
+
+    Cache entries are the ETag on the first line followed by the raw response body.
+    Anything else (missing, unreadable, old format) is a miss.
+    """
+    with contextlib.ExitStack() as stack:
+        etag = None
+        try:
+            cached = stack.enter_context(cache_file.open("rb"))
+            line = cached.readline()
+            if len(line) > 1 and line.endswith(b"\n"):
+                etag = line[:-1].decode("latin-1")
+        except OSError:
+            pass
+
+        extra_headers = {"If-None-Match": etag} if etag else None
+        resp = open_request("GET", path, accept=accept, extra_headers=extra_headers)
+        if resp.status == 304 and etag:
+            resp.read()
+            shutil.copyfileobj(cached, out, CHUNK_SIZE)
+            return
+
+        # Tee a 200 body into a new cache entry (never another status, later 304s would replay it);
+        # caching is best effort and never stops the copy.
+        sink = _new_cache_entry(cache_file, resp.getheader("ETag")) if resp.status == 200 else None
+        try:
+            while True:
+                chunk = resp.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+                if sink is not None:
+                    try:
+                        sink.write(chunk)
+                    except OSError:
+                        _discard(sink)
+                        sink = None
+        except BaseException:
+            if sink is not None:
+                _discard(sink)
+            raise
+
+    if sink is not None:
+        try:
+            sink.close()
+            os.replace(sink.name, cache_file)
+        except OSError:
+            _discard(sink)
+
+
+def _new_cache_entry(cache_file: Path, etag: Optional[str]) -> Optional[BinaryIO]:
+    """
+    Private temporary file next to cache_file with the ETag line written, or None
+    when there is nothing to revalidate with or it can't be created.
+    """
+    if not etag:
+        return None
+    try:
+        header = etag.encode("latin-1") + b"\n"
+        ensure_cache_dir(cache_file)
+        sink = tempfile.NamedTemporaryFile(dir=cache_file.parent, suffix=".tmp", delete=False)
+    except (OSError, UnicodeEncodeError):
+        return None
+    try:
+        sink.write(header)
+    except OSError:
+        _discard(sink)
+        return None
+    return sink
+
+
+def _discard(sink: BinaryIO) -> None:
+    with contextlib.suppress(OSError):
+        sink.close()
+    with contextlib.suppress(OSError):
+        os.unlink(sink.name)
+
+
+def get_cached(path: str, cache_file: Path, accept: str = "application/vnd.github+json") -> bytes:
+    buf = io.BytesIO()
+    stream_cached(path, cache_file, buf, accept=accept)
+    return buf.getvalue()
+
+
+def get_json(path: str, cache_file: Path) -> Any:
+    out = get_cached(path, cache_file)
+    try:
+        return loads(out)
+    except json.JSONDecodeError as e:
+        raise RuntimeError(f"Failed to parse JSON response: {e}\nRaw:\n{out!r}") from e
+
+
+def get_paginated(path: str, cache_prefix: str) -> list[dict[str, Any]]:
+    items: list[dict[str, Any]] = []
+    page = 1
+    while True:
+        batch = get_json(f"{path}?per_page={PER_PAGE}&page={page}", CACHE_DIR / f"{cache_prefix}_{page}.cache")
+        items.extend(batch)
+        if len(batch) < PER_PAGE:
+            return items
+        page += 1
+
+
+def resolve_repo() -> Tuple[str, str]:
+    """
+    Let gh resolve the current repository (remotes, default repo, GH_REPO...).
+    """
+    url = run_json(["gh", "repo", "view", "--json", "url"])["url"]
+    m = GITHUB_REPO_URL_RE.fullmatch(url)
+    if not m:
+        raise RuntimeError(f"Unsupported repository URL: {url!r}. Only github.com is supported.")
+    return m.group(1), m.group(2)
+
+
+def resolve_pr(pr_ref: Optional[str]) -> Tuple[str, str, int]:
+    """
+    Resolve PR number + owner/name of the repository the PR lives in (the base
+    repository, so cross-repo PRs work too).
+    PR URLs are parsed directly without spawning gh; numbers and the current
+    branch (pr_ref is None) are resolved by `gh pr view`.
+    """
+    m = GITHUB_PR_URL_RE.search(pr_ref) if pr_ref else None
+    if not m:
+        cmd = ["gh", "pr", "view"]
+        if pr_ref:
+            cmd.append(pr_ref)
+        cmd += ["--json", "url"]
+        url = run_json(cmd)["url"]
+        m = GITHUB_PR_URL_RE.search(url)
+        if not m:
+            raise RuntimeError(f"Unsupported PR URL: {url!r}. Only github.com is supported.")
+    return m.group(1), m.group(2), int(m.group(3))
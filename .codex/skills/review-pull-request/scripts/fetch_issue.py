@@ -1,57 +1,48 @@
 #!/usr/bin/env python3
 """
-Fetch a GitHub Issue (title/body/metadata + comments) by issue number using gh CLI.
+Fetch one or more GitHub Issues (title/body/metadata + comments) by issue number.
+
+gh CLI resolves the repository and provides the auth token; the issue itself is
+fetched from the GitHub REST API over a single keep-alive HTTPS connection.
+Responses are cached in ~/.cache/mydotcodex and revalidated with ETags (If-None-Match).
 
 Usage:
   python3 scripts/fetch_issue.py 123
   python3 scripts/fetch_issue.py "#123"
+  python3 scripts/fetch_issue.py 123 "#124" 130
 
 Requirements:
   - gh installed
   - `gh auth login` done
-  - run inside a git repo that has the issue (or `gh` can resolve the repo context)
+  - run inside a git repo that has the issue (or `gh` can resolve the repo context);
+    only github.com repositories are supported
 
 Output:
   Prints a JSON object to stdout with:
     - issue: {number, title, url, state, body, labels, assignees, author, createdAt, updatedAt}
     - comments: [{id, author, createdAt, updatedAt, body}, ...]
+  When several issue numbers are given, prints a JSON array of such objects (same order).
 """
 
 from __future__ import annotations
 
-import json
 import re
-import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from typing import Any
 
+from _github import CACHE_DIR, ensure_gh_authenticated, get_json, get_paginated, resolve_repo, write_result
 
-def _run(cmd: list[str]) -> str:
-    p = subprocess.run(cmd, capture_output=True, text=True)
-    if p.returncode != 0:
-        raise RuntimeError(f"Command failed: {' '.join(cmd)}\n{p.stderr.strip()}")
-    return p.stdout
-
-
-def _run_json(cmd: list[str]) -> dict[str, Any]:
-    out = _run(cmd)
-    try:
-        return json.loads(out)
-    except json.JSONDecodeError as e:
-        raise RuntimeError(f"Failed to parse JSON output: {e}\nRaw:\n{out}") from e
-
+MAX_WORKERS = 8
 
-def _ensure_gh_authenticated() -> None:
-    try:
-        _run(["gh", "auth", "status"])
-    except Exception:
-        raise RuntimeError("GitHub CLI is not authenticated. Run: gh auth login") from None
+_ISSUE_NUM_RE = re.compile(r"\d+")
 
 
 def _parse_issue_number(arg: str) -> int:
     s = arg.strip()
     s = s.lstrip("#")
-    if not re.fullmatch(r"\d+", s):
+    if not _ISSUE_NUM_RE.fullmatch(s):
         raise ValueError(f"Invalid issue number: {arg!r}. Expected something like 123 or #123.")
     n = int(s)
     if n < 1:
@@ -59,69 +50,66 @@ def _parse_issue_number(arg: str) -> int:
     return n
 
 
-def fetch_issue(issue_number: int) -> dict[str, Any]:
+def fetch_issue(owner: str, repo: str, issue_number: int) -> dict[str, Any]:
     """
-    Use `gh issue view` JSON fields. This works well for most repos and includes comments.
+    Use the REST issue + issue comments endpoints, normalized to the same shape
+    `gh issue view --json` produces.
     """
-    fields = ",".join(
-        [
-            "number",
-            "title",
-            "url",
-            "state",
-            "body",
-            "author",
-            "createdAt",
-            "updatedAt",
-            "assignees",
-            "labels",
-            "comments",
-        ]
-    )
-
-    payload = _run_json(["gh", "issue", "view", str(issue_number), "--json", fields])
-
-    # Normalize the shape slightly (gh returns nested structures)
+    base = f"/repos/{owner}/{repo}/issues/{issue_number}"
+    cache_key = f"issues/{owner}_{repo}_{issue_number}"
+
+    payload = get_json(base, CACHE_DIR / f"{cache_key}.cache")
+    comments = get_paginated(f"{base}/comments", f"{cache_key}_comments")
+
+    # Normalize the shape slightly (REST returns nested structures)
     issue = {
         "number": payload.get("number"),
         "title": payload.get("title"),
-        "url": payload.get("url"),
-        "state": payload.get("state"),
+        "url": payload.get("html_url"),
+        "state": (payload.get("state") or "").upper(),
         "body": payload.get("body") or "",
-        "author": (payload.get("author") or {}).get("login"),
-        "createdAt": payload.get("createdAt"),
-        "updatedAt": payload.get("updatedAt"),
-        "assignees": [a.get("login") for a in (payload.get("assignees") or []) if isinstance(a, dict)],
-        "labels": [l.get("name") for l in (payload.get("labels") or []) if isinstance(l, dict)],
+        "author": (payload.get("user") or {}).get("login"),
+        "createdAt": payload.get("created_at"),
+        "updatedAt": payload.get("updated_at"),
+        "assignees": list(map(itemgetter("login"), payload.get("assignees") or ())),
+        "labels": list(map(itemgetter("name"), payload.get("labels") or ())),
     }
 
-    comments_out: list[dict[str, Any]] = []
-    for c in payload.get("comments") or []:
-        if not isinstance(c, dict):
-            continue
-        comments_out.append(
-            {
-                "id": c.get("id"),
-                "author": (c.get("author") or {}).get("login"),
-                "createdAt": c.get("createdAt"),
-                "updatedAt": c.get("updatedAt"),
-                "body": c.get("body") or "",
-            }
-        )
+    # REST comment objects always carry these keys.
+    comments_out = [
+        {
+            "id": c["node_id"],
+            "author": (c["user"] or {}).get("login"),
+            "createdAt": c["created_at"],
+            "updatedAt": c["updated_at"],
+            "body": c["body"] or "",
+        }
+        for c in comments
+    ]
 
     return {"issue": issue, "comments": comments_out}
 
 
+def fetch_issues(issue_numbers: list[int]) -> list[dict[str, Any]]:
+    """
+    Resolve the repository once, then fetch the issues concurrently (one connection per worker).
+    """
+    owner, repo = resolve_repo()
+    with ThreadPoolExecutor(max_workers=min(len(issue_numbers), MAX_WORKERS)) as executor:
+        return list(executor.map(lambda n: fetch_issue(owner, repo, n), issue_numbers))
+
+
 def main() -> None:
-    if len(sys.argv) != 2:
-        print("Usage: python3 scripts/fetch_issue.py <issue_number_or_#issue_number>", file=sys.stderr)
+    if len(sys.argv) < 2:
+        print("Usage: python3 scripts/fetch_issue.py <issue_number_or_#issue_number> [...]", file=sys.stderr)
         sys.exit(2)
 
     try:
-        issue_number = _parse_issue_number(sys.argv[1])
-        _ensure_gh_authenticated()
-        result = fetch_issue(issue_number)
-        print(json.dumps(result, indent=2))
+        issue_numbers = [_parse_issue_number(arg) for arg in sys.argv[1:]]
+        ensure_gh_authenticated()
+        results = fetch_issues(issue_numbers)
+        # A single issue keeps the historical single-object output.
+        write_result(results[0] if len(results) == 1 else results)
     except Exception as e:
         print(str(e), file=sys.stderr)
         sys.exit(1)
@@ -8,10 +8,27 @@ Usage:
   python3 scripts/fetch_pr_comments.py 3698
   python3 scripts/fetch_pr_comments.py "#3698"
   python3 scripts/fetch_pr_comments.py https://github.com/org/repo/pull/3698
+  python3 scripts/fetch_pr_comments.py 3698 --include-resolved
+
+Options:
+  --include-resolved  also fetch the comments of resolved review threads. By default
+                      resolved threads are listed (location, isResolved, isOutdated)
+                      with an empty comments list, which keeps payloads small on
+                      long-lived PRs.
 
 Requires:
   - `gh auth login` already set up
 
+Environment:
+  FETCH_PR_COMMENTS_PAGE_SIZE  size of the first page of each connection (default 25, max 100);
+                               it doubles on every following page, up to 100.
+
+gh is kept off the pagination path: it only resolves the PR (skipped for PR URLs)
+and provides the auth token. GraphQL pages are fetched over persistent HTTPS
+connections (one per pagination thread), so a PR with N pages costs N requests
+on warm sockets rather than N gh processes. Results are cached in
+~/.cache/mydotcodex/pr and reused as long as the PR updatedAt is unchanged.
+
 Output JSON:
   {
     "pull_request": {number, url, title, state, owner, repo},
@@ -23,21 +40,33 @@ Output JSON:
 
 from __future__ import annotations
 
-import json
+import os
 import re
-import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Any, Optional, Tuple
 
-QUERY = """\
-query(
-  $owner: String!,
-  $repo: String!,
-  $number: Int!,
-  $commentsCursor: String,
-  $reviewsCursor: String,
-  $threadsCursor: String
-) {
+from _github import CACHE_DIR, atomic_write, dumps, ensure_gh_authenticated, graphql, loads, resolve_pr, write_result
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+_PR_HASH_RE = re.compile(r"#\d+")
+_PR_NUM_RE = re.compile(r"\d+")
+_PR_URL_RE = re.compile(r"/pull/(\d+)")
+
+# Cheap probe used to reuse the previous result when the PR hasn't changed.
+UPDATED_AT_QUERY = """\
+query($owner: String!, $repo: String!, $number: Int!) {
+  repository(owner: $owner, name: $repo) {
+    pullRequest(number: $number) { updatedAt }
+  }
+}
+"""
+
+# One query per connection so each one can paginate on its own cursor.
+QUERY_TEMPLATE = """\
+query($owner: String!, $repo: String!, $number: Int!, $first: Int!, $cursor: String) {
   repository(owner: $owner, name: $repo) {
     pullRequest(number: $number) {
       number
@@ -45,7 +74,15 @@ query(
       title
       state
 
-      comments(first: 100, after: $commentsCursor) {
+      %s
+    }
+  }
+}
+"""
+
+CONNECTIONS = {
+    "comments": """\
+comments(first: $first, after: $cursor) {
         pageInfo { hasNextPage endCursor }
         nodes {
           id
@@ -54,9 +91,9 @@ query(
           updatedAt
           author { login }
         }
-      }
-
-      reviews(first: 100, after: $reviewsCursor) {
+      }""",
+    "reviews": """\
+reviews(first: $first, after: $cursor) {
         pageInfo { hasNextPage endCursor }
         nodes {
           id
@@ -65,9 +102,9 @@ query(
           submittedAt
           author { login }
         }
-      }
-
-      reviewThreads(first: 100, after: $threadsCursor) {
+      }""",
+    "reviewThreads": """\
+reviewThreads(first: $first, after: $cursor) {
         pageInfo { hasNextPage endCursor }
         nodes {
           id
@@ -80,161 +117,155 @@ query(
           startDiffSide
           originalLine
           originalStartLine
-          comments(first: 100) {
-            nodes {
-              id
-              body
-              createdAt
-              updatedAt
-              author { login }
-            }
-          }
+        }
+      }""",
+}
+
+# Second pass for review threads: comments of the selected threads, up to 100 threads per query.
+THREAD_COMMENTS_QUERY = """\
+query($ids: [ID!]!) {
+  nodes(ids: $ids) {
+    ... on PullRequestReviewThread {
+      id
+      comments(first: 100) {
+        nodes {
+          id
+          body
+          createdAt
+          updatedAt
+          author { login }
         }
       }
     }
   }
 }
 """
-
-
-def _run(cmd: list[str], stdin: Optional[str] = None) -> str:
-    p = subprocess.run(cmd, input=stdin, capture_output=True, text=True)
-    if p.returncode != 0:
-        raise RuntimeError(f"Command failed: {' '.join(cmd)}\n{p.stderr.strip()}")
-    return p.stdout
-
-
-def _run_json(cmd: list[str], stdin: Optional[str] = None) -> dict[str, Any]:
-    out = _run(cmd, stdin=stdin)
-    try:
-        return json.loads(out)
-    except json.JSONDecodeError as e:
-        raise RuntimeError(f"Failed to parse JSON from command output: {e}\nRaw:\n{out}") from e
-
-
-def _ensure_gh_authenticated() -> None:
-    try:
-        _run(["gh", "auth", "status"])
-    except Exception:
-        raise RuntimeError("GitHub CLI is not authenticated. Run: gh auth login") from None
+THREAD_BATCH_SIZE = 100
 
 
 def _parse_pr_ref(arg: str) -> str:
     s = arg.strip()
 
-    if re.fullmatch(r"#\d+", s):
+    if _PR_HASH_RE.fullmatch(s):
         return s.lstrip("#")
 
-    if re.fullmatch(r"\d+", s):
+    if _PR_NUM_RE.fullmatch(s):
         return s
 
-    m = re.search(r"/pull/(\d+)", s)
+    m = _PR_URL_RE.search(s)
     if m:
         return s  # keep URL, gh can resolve it
 
     raise ValueError(f"Invalid PR reference: {arg!r}. Expected a number (e.g. 3698), #3698, or a PR URL.")
 
 
-def _get_pr_owner_repo_number(pr_ref: Optional[str]) -> Tuple[str, str, int]:
-    """
-    Resolve PR number + head repo owner/name. Works for cross-repo PRs too.
-    If pr_ref is None, resolves the PR associated with current branch.
-    """
-    fields = "number,headRepositoryOwner,headRepository"
-    cmd = ["gh", "pr", "view"]
-    if pr_ref:
-        cmd.append(pr_ref)
-    cmd += ["--json", fields]
+def _gh_api_graphql_single(
+        owner: str,
+        repo: str,
+        number: int,
+        kind: str,
+        first: int,
+        cursor: Optional[str] = None,
+) -> dict[str, Any]:
+    variables: dict[str, Any] = {"owner": owner, "repo": repo, "number": number, "first": first, "cursor": cursor}
+    return graphql(QUERY_TEMPLATE % CONNECTIONS[kind], variables)
+
 
-    pr = _run_json(cmd)
-    owner = pr["headRepositoryOwner"]["login"]
-    repo = pr["headRepository"]["name"]
-    number = int(pr["number"])
-    return owner, repo, number
+def _initial_page_size() -> int:
+    raw = os.environ.get("FETCH_PR_COMMENTS_PAGE_SIZE")
+    if raw is None:
+        return DEFAULT_PAGE_SIZE
+    if not _PR_NUM_RE.fullmatch(raw.strip()) or not 1 <= int(raw) <= MAX_PAGE_SIZE:
+        raise ValueError(f"Invalid FETCH_PR_COMMENTS_PAGE_SIZE: {raw!r}. Expected an integer between 1 and {MAX_PAGE_SIZE}.")
+    return int(raw)
 
 
-def _gh_api_graphql(
+def _paginate(
         owner: str,
         repo: str,
         number: int,
-        comments_cursor: Optional[str] = None,
-        reviews_cursor: Optional[str] = None,
-        threads_cursor: Optional[str] = None,
-) -> dict[str, Any]:
-    cmd = [
-        "gh",
-        "api",
-        "graphql",
-        "-F",
-        "query=@-",
-        "-F",
-        f"owner={owner}",
-        "-F",
-        f"repo={repo}",
-        "-F",
-        f"number={number}",
-    ]
-    if comments_cursor:
-        cmd += ["-F", f"commentsCursor={comments_cursor}"]
-    if reviews_cursor:
-        cmd += ["-F", f"reviewsCursor={reviews_cursor}"]
-    if threads_cursor:
-        cmd += ["-F", f"threadsCursor={threads_cursor}"]
-
-    return _run_json(cmd, stdin=QUERY)
-
-
-def fetch_all(owner: str, repo: str, number: int) -> dict[str, Any]:
-    conversation_comments: list[dict[str, Any]] = []
-    reviews: list[dict[str, Any]] = []
-    review_threads: list[dict[str, Any]] = []
-
-    comments_cursor: Optional[str] = None
-    reviews_cursor: Optional[str] = None
-    threads_cursor: Optional[str] = None
-
+        kind: str,
+        first: int,
+) -> Tuple[dict[str, Any], list[dict[str, Any]]]:
+    """
+    Walk a single pullRequest connection until its last page.
+    Pages start small (most PRs have few items) and double up to MAX_PAGE_SIZE.
+    Returns the PR node of the first page (for metadata) and all collected nodes.
+    """
+    nodes: list[dict[str, Any]] = []
+    cursor: Optional[str] = None
     pr_meta: Optional[dict[str, Any]] = None
 
     while True:
-        payload = _gh_api_graphql(
-            owner=owner,
-            repo=repo,
-            number=number,
-            comments_cursor=comments_cursor,
-            reviews_cursor=reviews_cursor,
-            threads_cursor=threads_cursor,
-        )
+        pr = _gh_api_graphql_single(owner, repo, number, kind, first, cursor)["repository"]["pullRequest"]
+        if pr_meta is None:
+            pr_meta = pr
 
-        if "errors" in payload and payload["errors"]:
-            raise RuntimeError(f"GitHub GraphQL errors:\n{json.dumps(payload['errors'], indent=2)}")
+        conn = pr[kind]
+        nodes.extend(conn.get("nodes") or ())
 
-        pr = payload["data"]["repository"]["pullRequest"]
-        if pr_meta is None:
-            pr_meta = {
-                "number": pr["number"],
-                "url": pr["url"],
-                "title": pr["title"],
-                "state": pr["state"],
-                "owner": owner,
-                "repo": repo,
-            }
-
-        c = pr["comments"]
-        r = pr["reviews"]
-        t = pr["reviewThreads"]
-
-        conversation_comments.extend(c.get("nodes") or [])
-        reviews.extend(r.get("nodes") or [])
-        review_threads.extend(t.get("nodes") or [])
-
-        comments_cursor = c["pageInfo"]["endCursor"] if c["pageInfo"]["hasNextPage"] else None
-        reviews_cursor = r["pageInfo"]["endCursor"] if r["pageInfo"]["hasNextPage"] else None
-        threads_cursor = t["pageInfo"]["endCursor"] if t["pageInfo"]["hasNextPage"] else None
-
-        if not (comments_cursor or reviews_cursor or threads_cursor):
+        if not conn["pageInfo"]["hasNextPage"]:
             break
+        cursor = conn["pageInfo"]["endCursor"]
+        first = min(first * 2, MAX_PAGE_SIZE)
+
+    return pr_meta, nodes
+
+
+def _paginate_review_threads(
+        owner: str,
+        repo: str,
+        number: int,
+        first: int,
+        include_resolved: bool,
+) -> Tuple[dict[str, Any], list[dict[str, Any]]]:
+    """
+    List the threads without their comments, then fetch comments in batches only
+    for the threads that need them (unresolved ones, unless include_resolved).
+    """
+    pr_meta, threads = _paginate(owner, repo, number, "reviewThreads", first)
+
+    wanted = [t["id"] for t in threads if include_resolved or not t["isResolved"]]
+    comments_by_id: dict[str, Any] = {}
+    for i in range(0, len(wanted), THREAD_BATCH_SIZE):
+        data = graphql(THREAD_COMMENTS_QUERY, {"ids": wanted[i:i + THREAD_BATCH_SIZE]})
+        for node in data["nodes"]:
+            if node:
+                comments_by_id[node["id"]] = node["comments"]
+
+    for t in threads:
+        t["comments"] = comments_by_id.get(t["id"], {"nodes": []})
+    return pr_meta, threads
+
+
+def fetch_all(owner: str, repo: str, number: int, include_resolved: bool = False) -> dict[str, Any]:
+    first = _initial_page_size()
+
+    # Connections are independent: paginate them concurrently so a long
+    # reviewThreads walk doesn't hold back comments and reviews.
+    with ThreadPoolExecutor(max_workers=len(CONNECTIONS)) as executor:
+        futures = {
+            "comments": executor.submit(_paginate, owner, repo, number, "comments", first),
+            "reviews": executor.submit(_paginate, owner, repo, number, "reviews", first),
+            "reviewThreads": executor.submit(
+                _paginate_review_threads, owner, repo, number, first, include_resolved
+            ),
+        }
+        wait(futures.values())
+
+    pr, conversation_comments = futures["comments"].result()
+    _, reviews = futures["reviews"].result()
+    _, review_threads = futures["reviewThreads"].result()
+
+    pr_meta = {
+        "number": pr["number"],
+        "url": pr["url"],
+        "title": pr["title"],
+        "state": pr["state"],
+        "owner": owner,
+        "repo": repo,
+    }
 
-    assert pr_meta is not None
     return {
         "pull_request": pr_meta,
         "conversation_comments": conversation_comments,
@@ -243,21 +274,55 @@ def fetch_all(owner: str, repo: str, number: int) -> dict[str, Any]:
     }
 
 
+def fetch_all_cached(owner: str, repo: str, number: int, include_resolved: bool = False) -> dict[str, Any]:
+    """
+    Return the last result for this PR if its updatedAt hasn't moved since, otherwise
+    run the full fetch_all pagination and store the new result.
+    """
+    data = graphql(UPDATED_AT_QUERY, {"owner": owner, "repo": repo, "number": number})
+    updated_at = data["repository"]["pullRequest"]["updatedAt"]
+
+    cache_file = CACHE_DIR / "pr" / f"{owner}_{repo}_{number}.json"
+    try:
+        cached = loads(cache_file.read_bytes())
+        if cached["updatedAt"] == updated_at and cached["includeResolved"] == include_resolved:
+            return cached["result"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    # updatedAt is read before fetching: if the PR changes in between, the stored
+    # stamp is older than the data and the next run simply fetches again.
+    result = fetch_all(owner, repo, number, include_resolved)
+    try:
+        with atomic_write(cache_file) as f:
+            f.write(dumps({"updatedAt": updated_at, "includeResolved": include_resolved, "result": result}))
+    except OSError:
+        pass  # caching is best effort
+    return result
+
+
 def main() -> None:
     pr_ref: Optional[str] = None
 
-    if len(sys.argv) > 2:
-        print("Usage: python3 scripts/fetch_pr_comments.py [pr_number|#pr_number|pr_url]", file=sys.stderr)
+    args = sys.argv[1:]
+    include_resolved = "--include-resolved" in args
+    args = [a for a in args if a != "--include-resolved"]
+
+    if len(args) > 1:
+        print(
+            "Usage: python3 scripts/fetch_pr_comments.py [pr_number|#pr_number|pr_url] [--include-resolved]",
+            file=sys.stderr,
+        )
         sys.exit(2)
 
-    if len(sys.argv) == 2:
-        pr_ref = _parse_pr_ref(sys.argv[1])
+    if args:
+        pr_ref = _parse_pr_ref(args[0])
 
     try:
-        _ensure_gh_authenticated()
-        owner, repo, number = _get_pr_owner_repo_number(pr_ref)
-        result = fetch_all(owner, repo, number)
-        print(json.dumps(result, indent=2))
+        ensure_gh_authenticated()
+        owner, repo, number = resolve_pr(pr_ref)
+        result = fetch_all_cached(owner, repo, number, include_resolved)
+        write_result(result)
     except Exception as e:
         print(str(e), file=sys.stderr)
         sys.exit(1)
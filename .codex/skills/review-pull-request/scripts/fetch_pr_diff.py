@@ -7,48 +7,79 @@ Usage:
   python3 scripts/fetch_pr_diff.py 3698
   python3 scripts/fetch_pr_diff.py "#3698"
   python3 scripts/fetch_pr_diff.py https://github.com/org/repo/pull/3698
+  python3 scripts/fetch_pr_diff.py 3698 --diff-only
 
 Requires:
   - `gh` installed
   - `gh auth login` already set up
-  - run inside a git repo that can resolve the PR context
+  - run inside a git repo that can resolve the PR context (unless a PR URL is given)
+
+gh CLI is only used to resolve the PR and read the auth token. Metadata + files come
+from one GraphQL query and the diff from the REST API, fetched concurrently over
+keep-alive HTTPS connections. The diff is cached in ~/.cache/mydotcodex and
+revalidated with its ETag (If-None-Match).
 
 Output JSON:
   {
-    "pr": {...},         # gh pr view --json fields
-    "diff": "..."        # gh pr diff output
+    "pr": {...},         # same fields as `gh pr view --json`
+    "diff": "..."        # same content as `gh pr diff`
   }
+
+With --diff-only, only the raw diff is written to stdout (no metadata, no JSON
+encoding). It is copied from the response (or the cache) in 64 KiB chunks, so
+memory stays flat for very large PRs piped to another tool.
 """
 
 from __future__ import annotations
 
-import json
 import re
-import subprocess
 import sys
-from typing import Any, Optional
-
-
-def _run(cmd: list[str]) -> str:
-    p = subprocess.run(cmd, capture_output=True, text=True)
-    if p.returncode != 0:
-        raise RuntimeError(f"Command failed: {' '.join(cmd)}\n{p.stderr.strip()}")
-    return p.stdout
-
-
-def _run_json(cmd: list[str]) -> dict[str, Any]:
-    out = _run(cmd)
-    try:
-        return json.loads(out)
-    except json.JSONDecodeError as e:
-        raise RuntimeError(f"Failed to parse JSON from command output: {e}\nRaw:\n{out}") from e
-
-
-def _ensure_gh_authenticated() -> None:
-    try:
-        _run(["gh", "auth", "status"])
-    except Exception:
-        raise RuntimeError("GitHub CLI is not authenticated. Run: gh auth login") from None
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from _github import (
+    CACHE_DIR,
+    ensure_gh_authenticated,
+    get_cached,
+    graphql,
+    resolve_pr,
+    stream_cached,
+    token,
+    write_result,
+)
+
+DIFF_ACCEPT = "application/vnd.github.v3.diff"
+
+_PR_HASH_RE = re.compile(r"#\d+")
+_PR_NUM_RE = re.compile(r"\d+")
+_PR_URL_RE = re.compile(r"/pull/(\d+)")
+
+# Metadata + changed files in one round trip (same fields as `gh pr view --json`).
+PR_QUERY = """\
+query($owner: String!, $repo: String!, $number: Int!, $filesCursor: String) {
+  repository(owner: $owner, name: $repo) {
+    pullRequest(number: $number) {
+      number
+      title
+      url
+      headRefName
+      baseRefName
+      state
+      author { login }
+      createdAt
+      updatedAt
+      additions
+      deletions
+      changedFiles
+      files(first: 100, after: $filesCursor) {
+        pageInfo { hasNextPage endCursor }
+        nodes { path additions deletions }
+      }
+    }
+  }
+}
+"""
 
 
 def _parse_pr_ref(arg: str) -> str:
@@ -64,15 +95,15 @@ def _parse_pr_ref(arg: str) -> str:
     s = arg.strip()
 
     # "#123" -> "123"
-    if re.fullmatch(r"#\d+", s):
+    if _PR_HASH_RE.fullmatch(s):
         return s.lstrip("#")
 
     # "123" -> "123"
-    if re.fullmatch(r"\d+", s):
+    if _PR_NUM_RE.fullmatch(s):
         return s
 
     # URL containing "/pull/<num>"
-    m = re.search(r"/pull/(\d+)", s)
+    m = _PR_URL_RE.search(s)
     if m:
         # gh accepts PR URL directly, keep it
         return s
@@ -80,43 +111,76 @@ def _parse_pr_ref(arg: str) -> str:
     raise ValueError(f"Invalid PR reference: {arg!r}. Expected a number (e.g. 3698), #3698, or a PR URL.")
 
 
-def _get_pr_view_json(pr_ref: Optional[str]) -> dict[str, Any]:
-    fields = "number,title,url,headRefName,baseRefName,state,author,createdAt,updatedAt,additions,deletions,changedFiles,files"
-    cmd = ["gh", "pr", "view"]
-    if pr_ref:
-        cmd.append(pr_ref)
-    cmd += ["--json", fields]
-    return _run_json(cmd)
+def _get_pr_view_json(owner: str, repo: str, number: int) -> dict[str, Any]:
+    """
+    Same shape as `gh pr view --json number,title,url,headRefName,baseRefName,state,author,
+    createdAt,updatedAt,additions,deletions,changedFiles,files`.
+    Only PRs with more than 100 changed files need extra pages.
+    """
+    variables: dict[str, Any] = {"owner": owner, "repo": repo, "number": number, "filesCursor": None}
+    files: list[dict[str, Any]] = []
+
+    while True:
+        pr = graphql(PR_QUERY, variables)["repository"]["pullRequest"]
+        files.extend(pr["files"]["nodes"] or ())
+        page_info = pr["files"]["pageInfo"]
+        if not page_info["hasNextPage"]:
+            break
+        variables["filesCursor"] = page_info["endCursor"]
 
+    pr["files"] = files
+    return pr
 
-def _get_pr_diff(pr_ref: Optional[str]) -> str:
-    cmd = ["gh", "pr", "diff"]
-    if pr_ref:
-        cmd.append(pr_ref)
-    return _run(cmd)
+
+def _diff_request(owner: str, repo: str, number: int) -> Tuple[str, Path]:
+    return f"/repos/{owner}/{repo}/pulls/{number}", CACHE_DIR / "pulls" / f"{owner}_{repo}_{number}_diff.cache"
+
+
+def _get_pr_diff(owner: str, repo: str, number: int) -> bytes:
+    path, cache_file = _diff_request(owner, repo, number)
+    return get_cached(path, cache_file, accept=DIFF_ACCEPT)
 
 
 def main() -> None:
     pr_ref: Optional[str] = None
 
-    if len(sys.argv) > 2:
-        print("Usage: python3 scripts/fetch_pr_diff.py [pr_number|#pr_number|pr_url]", file=sys.stderr)
+    args = sys.argv[1:]
+    diff_only = "--diff-only" in args
+    args = [a for a in args if a != "--diff-only"]
+
+    if len(args) > 1:
+        print("Usage: python3 scripts/fetch_pr_diff.py [pr_number|#pr_number|pr_url] [--diff-only]", file=sys.stderr)
         sys.exit(2)
 
-    if len(sys.argv) == 2:
-        pr_ref = _parse_pr_ref(sys.argv[1])
+    if args:
+        pr_ref = _parse_pr_ref(args[0])
 
     try:
-        _ensure_gh_authenticated()
-        pr_json = _get_pr_view_json(pr_ref)
-        diff = _get_pr_diff(pr_ref)
+        ensure_gh_authenticated()
+        owner, repo, number = resolve_pr(pr_ref)
+
+        if diff_only:
+            # Raw bytes copied in chunks from the response (or the ETag cache): no decode, no JSON escaping.
+            path, cache_file = _diff_request(owner, repo, number)
+            sys.stdout.flush()
+            stream_cached(path, cache_file, sys.stdout.buffer, accept=DIFF_ACCEPT)
+            return
+
+        # Metadata and diff are independent: fetch them concurrently. Read the token
+        # first so the workers start with it (PR URLs never touch gh in resolve_pr).
+        token()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            f_pr = executor.submit(_get_pr_view_json, owner, repo, number)
+            f_diff = executor.submit(_get_pr_diff, owner, repo, number)
+            pr_json = f_pr.result()
+            diff = f_diff.result().decode(errors="replace")
 
         result = {
             "pr": pr_json,
             "diff": diff,
         }
 
-        print(json.dumps(result, indent=2))
+        write_result(result)
     except Exception as e:
         print(str(e), file=sys.stderr)
         sys.exit(1)